@@ -0,0 +1,81 @@
+import jobs, {
+  refreshActiveJobs,
+  jobStatusPayload,
+  checkRemoteTask,
+  remoteStatusPayload
+} from "../lib/jobs.js";
+import { getClientIP } from "../lib/ratelimit.js";
+
+export const config = { api: { bodyParser: false } };
+
+const POLL_INTERVAL_MS = 2000;
+const MAX_STREAM_MS = 280 * 1000; // end cleanly before the 300s maxDuration kills us
+
+export default async function handler(req, res) {
+  res.setHeader("Access-Control-Allow-Origin", "*");
+  res.setHeader("Access-Control-Allow-Methods", "GET,OPTIONS");
+  res.setHeader("Access-Control-Allow-Headers", "Content-Type,Authorization");
+
+  if (req.method === "OPTIONS") return res.status(200).end();
+  if (req.method !== "GET") return res.status(405).json({ error: "Method not allowed" });
+
+  const uploadId = req.query?.job;
+  if (!uploadId) {
+    return res.status(404).json({ error: "Job not found" });
+  }
+
+  // This function is bundled separately from separate.js, so the job may only
+  // exist upstream; refuse the stream only if LALAL.AI has never seen the id
+  if (!jobs.has(uploadId)) {
+    const remote = await checkRemoteTask(uploadId).catch(() => null);
+    if (!remote) {
+      return res.status(404).json({ error: "Job not found" });
+    }
+  }
+
+  const ip = getClientIP(req);
+
+  res.writeHead(200, {
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache, no-transform",
+    Connection: "keep-alive"
+  });
+
+  // writableEnded only reflects our own end(); a closed tab surfaces here
+  let clientGone = false;
+  req.on("close", () => {
+    clientGone = true;
+  });
+
+  const deadline = Date.now() + MAX_STREAM_MS;
+  let lastPayload = "";
+
+  // One long-lived connection replaces the per-poll requests: push a frame
+  // only when the job's state or progress actually changes
+  while (Date.now() < deadline && !clientGone && !res.writableEnded) {
+    const job = jobs.get(uploadId);
+    let statusBody;
+
+    if (job) {
+      if (job.state === "processing") {
+        await refreshActiveJobs().catch((err) => console.error("Status sweep error:", err));
+      }
+      statusBody = jobStatusPayload(uploadId, job, ip);
+    } else {
+      const remote = await checkRemoteTask(uploadId).catch(() => null);
+      if (!remote) break;
+      statusBody = remoteStatusPayload(uploadId, remote);
+    }
+
+    const payload = JSON.stringify(statusBody);
+    if (payload !== lastPayload) {
+      res.write(`data: ${payload}\n\n`);
+      lastPayload = payload;
+    }
+
+    if (statusBody.state !== "processing") break;
+    await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+  }
+
+  res.end();
+}
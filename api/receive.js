@@ -1,10 +1,19 @@
 import formidable from "formidable";
+import { mkdirSync } from "fs";
+import { tmpdir } from "os";
+import { join } from "path";
 import uploads from "../lib/uploads.js";
 
 export const config = {
   api: { bodyParser: false }
 };
 
+const MAX_FILE_SIZE = 80 * 1024 * 1024; // matches the limit enforced in separate.js
+
+// One scratch directory per instance, created at boot and reused across requests
+const UPLOAD_DIR = join(tmpdir(), "muteone_uploads");
+mkdirSync(UPLOAD_DIR, { recursive: true });
+
 function setCORSHeaders(res) {
   res.setHeader("Access-Control-Allow-Origin", "*");
   res.setHeader("Access-Control-Allow-Methods", "POST, OPTIONS");
@@ -26,17 +35,21 @@ export default async function handler(req, res) {
   }
 
   try {
-    const form = formidable({ multiples: false, keepExtensions: true });
+    const form = formidable({ multiples: false, keepExtensions: true, maxFileSize: MAX_FILE_SIZE, uploadDir: UPLOAD_DIR });
     form.parse(req, (err, fields, files) => {
       setCORSHeaders(res);
       console.log('Form parse result:', { err, fields, files });
 
       if (err) {
         console.error("Form parse error:", err);
+        if (err.httpCode === 413) {
+          return res.status(413).json({ error: "File too large (over 80MB)" });
+        }
         return res.status(500).json({ error: "File upload failed" });
       }
 
-      const file = files.file;
+      // formidable v3 wraps each field's files in an array
+      const file = Array.isArray(files.file) ? files.file[0] : files.file;
       if (!file) {
         console.log('No file received');
         return res.status(400).json({ error: "No file provided" });
@@ -1,64 +1,26 @@
-const fetch = (...args) => import("node-fetch").then(({ default: fetch }) => fetch(...args));
-import uploads from "../lib/uploads.js";
+import uploads, { hashFile } from "../lib/uploads.js";
+import jobs, {
+  refreshActiveJobs,
+  jobStatusPayload,
+  activeJobCount,
+  checkRemoteTask,
+  remoteStatusPayload
+} from "../lib/jobs.js";
+import { hasLicense, authHeader, uploadFile, splitTrack } from "../lib/lalal.js";
+import { getResult } from "../lib/results.js";
+import {
+  DAILY_LIMIT,
+  getClientIP,
+  checkRateLimit,
+  setProcessing,
+  decrementRate
+} from "../lib/ratelimit.js";
 
 export const config = { api: { bodyParser: true } };
 
-// Daily usage control
-const DAILY_LIMIT = 3;
 const MAX_DURATION_SECONDS = 300; // 5 minutes
-const dailyUploads = new Map();
-
-function getClientIP(req) {
-  return (
-    req.headers["x-forwarded-for"]?.split(",")[0]?.trim() ||
-    req.headers["x-real-ip"] ||
-    req.socket?.remoteAddress ||
-    "127.0.0.1"
-  );
-}
-
-function cleanupOldEntries() {
-  const today = new Date().toDateString();
-  for (const [ip, data] of dailyUploads.entries()) {
-    if (data.date !== today) dailyUploads.delete(ip);
-  }
-}
-setInterval(cleanupOldEntries, 60 * 60 * 1000);
-
-function checkRateLimit(ip) {
-  const today = new Date().toDateString();
-  const data = dailyUploads.get(ip);
-  if (!data || data.date !== today) {
-    dailyUploads.set(ip, { count: 0, date: today, processing: false });
-    return { allowed: true, remaining: DAILY_LIMIT };
-  }
-  if (data.processing) return { allowed: false, error: "Already processing", remaining: DAILY_LIMIT - data.count };
-  return { allowed: data.count < DAILY_LIMIT, remaining: DAILY_LIMIT - data.count };
-}
-
-function setProcessing(ip, val) {
-  const today = new Date().toDateString();
-  const data = dailyUploads.get(ip) || { count: 0, date: today };
-  data.processing = val;
-  dailyUploads.set(ip, data);
-}
-
-function incrementRate(ip) {
-  const today = new Date().toDateString();
-  const data = dailyUploads.get(ip) || { count: 0, date: today, processing: false };
-  data.count += 1;
-  data.processing = false;
-  dailyUploads.set(ip, data);
-}
-
-function decrementRate(ip) {
-  const data = dailyUploads.get(ip);
-  if (data) {
-    data.count = Math.max(0, data.count - 1);
-    data.processing = false;
-    dailyUploads.set(ip, data);
-  }
-}
+const MAX_FILE_SIZE = 80 * 1024 * 1024;
+const MAX_ACTIVE_JOBS = 4;
 
 // Allowed stems
 const ALLOWED_STEMS = new Set([
@@ -76,8 +38,7 @@ export default async function handler(req, res) {
   if (req.method !== "POST") return res.status(405).json({ error: "Method not allowed" });
 
   const ip = getClientIP(req);
-  const license = process.env.LALAL_API_KEY;
-  if (!license) return res.status(500).json({ error: "Missing LALAL_API_KEY" });
+  if (!hasLicense) return res.status(500).json({ error: "Missing LALAL_API_KEY" });
 
   try {
     const { action, uploadId, filename, fileSize, estimatedDuration, stem } = req.body;
@@ -120,7 +81,7 @@ export default async function handler(req, res) {
         });
       }
       
-      if (fileSize > 80 * 1024 * 1024) {
+      if (fileSize > MAX_FILE_SIZE) {
         return res.status(413).json({ error: "File too large (over 80MB)" });
       }
       
@@ -131,8 +92,8 @@ export default async function handler(req, res) {
       // Mark as processing to prevent concurrent uploads
       setProcessing(ip, true);
       
-      return res.status(200).json({ 
-        auth_header: `license ${license}`,
+      return res.status(200).json({
+        auth_header: authHeader,
         remaining: rateCheck.remaining - 1
       });
     }
@@ -149,75 +110,78 @@ export default async function handler(req, res) {
         return res.status(400).json({ error: "Invalid stem" });
       }
 
+      // Bound how many separations this instance drives at once
+      if (activeJobCount() >= MAX_ACTIVE_JOBS) {
+        setProcessing(ip, false);
+        return res.status(429).json({ error: "Server busy - please try again in a minute" });
+      }
+
       try {
-        // Step 1: Initiate processing on LALAL.AI
-        const params = JSON.stringify([{ id: uploadId, stem }]);
-        const splitResponse = await fetch("https://www.lalal.ai/api/split/", {
-          method: "POST",
-          headers: {
-            Authorization: `license ${license}`,
-            "Content-Type": "application/x-www-form-urlencoded"
-          },
-          body: new URLSearchParams({ params })
-        });
-        
-        const splitResult = await splitResponse.json().catch(() => ({}));
+        let splitId = uploadId;
+
+        // Stored captures are cached by content hash, so re-forwarding the
+        // same audio still hits; web uploads only have their LALAL id
+        let cacheKey = `${uploadId}:${stem}`;
+        if (uploads.has(uploadId)) {
+          const stored = uploads.get(uploadId);
+          if (!stored.contentHash) {
+            stored.contentHash = await hashFile(stored.filepath);
+          }
+          cacheKey = `${stored.contentHash}:${stem}`;
+        }
 
-        if (splitResult?.status !== "success") {
-          decrementRate(ip);
-          return res.status(502).json({ error: "Processing initialization failed" });
+        // Splits are deterministic per (audio, stem), so a cached result
+        // skips LALAL.AI entirely and does not count against the daily limit
+        const cached = getResult(cacheKey);
+        if (cached) {
+          setProcessing(ip, false);
+          const job = {
+            stem,
+            ip,
+            lalalId: splitId,
+            cacheKey,
+            state: "success",
+            result: cached,
+            createdAt: Date.now()
+          };
+          jobs.set(splitId, job);
+          return res.status(200).json(jobStatusPayload(splitId, job, ip));
         }
 
-        // Step 2: Poll for completion
-        let attempt = 0;
-        let processingResult = null;
-        const maxAttempts = 180; // 6 minutes maximum
-
-        while (attempt < maxAttempts) {
-          const checkResponse = await fetch("https://www.lalal.ai/api/check/", {
-            method: "POST",
-            headers: {
-              Authorization: `license ${license}`,
-              "Content-Type": "application/x-www-form-urlencoded"
-            },
-            body: new URLSearchParams({ id: uploadId })
-          });
-          
-          const checkResult = await checkResponse.json().catch(() => ({}));
-          const taskInfo = checkResult?.result?.[uploadId];
-          const taskState = taskInfo?.task?.state;
-
-          if (taskState === "success") {
-            processingResult = taskInfo.split;
-            break;
-          } else if (taskState === "error" || taskState === "cancelled") {
+        // Extension captures live on local disk; stream them up to LALAL.AI
+        // without buffering the file in memory
+        if (uploads.has(uploadId)) {
+          const stored = uploads.get(uploadId);
+          const uploadResult = await uploadFile(stored.filepath, stored.filename);
+          if (uploadResult?.status !== "success" || !uploadResult.id) {
             decrementRate(ip);
-            return res.status(502).json({ error: "Processing failed" });
+            return res.status(502).json({ error: "Upload forwarding failed" });
           }
-          
-          // Wait 2 seconds before next check
-          await new Promise(resolve => setTimeout(resolve, 2000));
-          attempt++;
+          splitId = uploadResult.id;
         }
 
-        if (!processingResult) {
+        // Step 1: Initiate processing on LALAL.AI
+        const splitResult = await splitTrack(splitId, stem);
+
+        if (splitResult?.status !== "success") {
           decrementRate(ip);
-          return res.status(504).json({ error: "Processing timeout" });
+          return res.status(502).json({ error: "Processing initialization failed" });
         }
 
-        // Success - increment usage and return result
-        incrementRate(ip);
-        const newRateCheck = checkRateLimit(ip);
-
-        return res.status(200).json({
-          ok: true,
-          id: uploadId,
-          stem_removed: stem,
-          back_track_url: processingResult.back_track,
-          stem_track_url: processingResult.stem_track,
-          remaining_uploads: newRateCheck.remaining
+        // Track the job under the upstream id and return immediately; the
+        // client watches that id, so cross-instance fallbacks can resolve it
+        jobs.set(splitId, {
+          stem,
+          ip,
+          lalalId: splitId,
+          cacheKey,
+          state: "processing",
+          result: null,
+          createdAt: Date.now()
         });
-        
+
+        return res.status(200).json({ ok: true, id: splitId, state: "processing" });
+
       } catch (err) {
         console.error("Processing error:", err);
         decrementRate(ip);
@@ -225,6 +189,38 @@ export default async function handler(req, res) {
       }
     }
 
+    // Status action - check progress of a previously started job
+    if (action === "status") {
+      if (!uploadId) {
+        return res.status(404).json({ error: "Job not found" });
+      }
+
+      const job = jobs.get(uploadId);
+
+      try {
+        if (job) {
+          // Only hit LALAL.AI while the job is still in flight; a failed
+          // sweep is transient, so answer from the last-known record rather
+          // than turning one network blip into a dead job
+          if (job.state === "processing") {
+            await refreshActiveJobs().catch((err) => console.error("Status sweep error:", err));
+          }
+          return res.status(200).json(jobStatusPayload(uploadId, job, ip));
+        }
+
+        // The job was started on another instance; follow it upstream directly
+        const remote = await checkRemoteTask(uploadId);
+        if (!remote) {
+          return res.status(404).json({ error: "Job not found" });
+        }
+        return res.status(200).json(remoteStatusPayload(uploadId, remote));
+
+      } catch (err) {
+        console.error("Status check error:", err);
+        return res.status(500).json({ error: "Status check failed" });
+      }
+    }
+
     return res.status(400).json({ error: "Invalid action" });
     
   } catch (err) {
@@ -0,0 +1,128 @@
+// lib/jobs.js
+import { checkTasks } from "./lalal.js";
+import { setResult } from "./results.js";
+import { checkRateLimit, incrementRate, decrementRate, setProcessing } from "./ratelimit.js";
+
+const TTL_MS = 60 * 60 * 1000;
+
+const jobs = new Map();
+
+function cleanupExpired() {
+  const cutoff = Date.now() - TTL_MS;
+  for (const [id, job] of jobs.entries()) {
+    if (job.createdAt < cutoff) {
+      // An unfinished job still holds its IP's processing lock; its count was
+      // never incremented, so only the flag needs releasing
+      if (job.state === "processing") setProcessing(job.ip, false);
+      jobs.delete(id);
+    }
+  }
+}
+setInterval(cleanupExpired, 60 * 60 * 1000);
+
+// Status polls share one upstream sweep that refreshes every in-flight job
+// with a single batched LALAL.AI check call, at most once per interval
+const CHECK_INTERVAL_MS = 2000;
+let pendingSweep = null;
+let lastSweepAt = 0;
+
+function applyTaskInfo(job, taskInfo) {
+  const taskState = taskInfo?.task?.state;
+
+  if (taskState === "success") {
+    job.state = "success";
+    job.result = taskInfo.split;
+    setResult(job.cacheKey, job.result);
+    incrementRate(job.ip);
+  } else if (taskState === "error" || taskState === "cancelled") {
+    job.state = "error";
+    decrementRate(job.ip);
+  } else {
+    job.progress = taskInfo?.task?.progress || 0;
+  }
+}
+
+export function refreshActiveJobs() {
+  if (pendingSweep) return pendingSweep;
+  if (Date.now() - lastSweepAt < CHECK_INTERVAL_MS) return Promise.resolve();
+
+  const active = [...jobs.values()].filter((job) => job.state === "processing");
+  if (active.length === 0) return Promise.resolve();
+
+  const ids = [...new Set(active.map((job) => job.lalalId))];
+  pendingSweep = checkTasks(ids.join(","))
+    .then((checkResult) => {
+      for (const job of active) {
+        const taskInfo = checkResult?.result?.[job.lalalId];
+        if (taskInfo) applyTaskInfo(job, taskInfo);
+      }
+    })
+    .finally(() => {
+      lastSweepAt = Date.now();
+      pendingSweep = null;
+    });
+  return pendingSweep;
+}
+
+// Job records are per-instance, so a poll can land on an instance that never
+// saw the process call; these helpers answer such polls from upstream directly
+export async function checkRemoteTask(id) {
+  const checkResult = await checkTasks(id);
+  const taskInfo = checkResult?.result?.[id];
+  if (!taskInfo) return null;
+
+  const taskState = taskInfo.task?.state;
+  if (taskState === "success") return { state: "success", split: taskInfo.split };
+  if (taskState === "error" || taskState === "cancelled") return { state: "error" };
+  return { state: "processing", progress: taskInfo.task?.progress || 0 };
+}
+
+// Deliberately omits remaining_uploads: this bundle's rate-limit map knows
+// nothing about the instance that did the counting
+export function remoteStatusPayload(uploadId, remote) {
+  if (remote.state === "success") {
+    return {
+      ok: true,
+      id: uploadId,
+      state: "success",
+      back_track_url: remote.split.back_track,
+      stem_track_url: remote.split.stem_track
+    };
+  }
+
+  if (remote.state === "error") {
+    return { state: "error", error: "Processing failed" };
+  }
+
+  return { state: "processing", progress: remote.progress };
+}
+
+export function activeJobCount() {
+  let count = 0;
+  for (const job of jobs.values()) {
+    if (job.state === "processing") count += 1;
+  }
+  return count;
+}
+
+export function jobStatusPayload(uploadId, job, ip) {
+  if (job.state === "success") {
+    return {
+      ok: true,
+      id: uploadId,
+      state: "success",
+      stem_removed: job.stem,
+      back_track_url: job.result.back_track,
+      stem_track_url: job.result.stem_track,
+      remaining_uploads: checkRateLimit(ip).remaining
+    };
+  }
+
+  if (job.state === "error") {
+    return { state: "error", error: "Processing failed" };
+  }
+
+  return { state: "processing", progress: job.progress || 0 };
+}
+
+export default jobs;
@@ -0,0 +1,49 @@
+// lib/lalal.js
+import { createReadStream } from "fs";
+
+const LALAL_API_URL = "https://www.lalal.ai/api";
+
+const license = process.env.LALAL_API_KEY;
+
+const formHeaders = {
+  Authorization: `license ${license}`,
+  "Content-Type": "application/x-www-form-urlencoded"
+};
+
+export const hasLicense = Boolean(license);
+export const authHeader = `license ${license}`;
+
+export async function uploadFile(filepath, filename) {
+  // The filename is client-supplied; quotes break the header quoting and
+  // control characters make the fetch call throw outright
+  const safeName = filename.replace(/[^\x20-\x7e]/g, "").replace(/["\\]/g, "") || "upload";
+  const response = await fetch(`${LALAL_API_URL}/upload/`, {
+    method: "POST",
+    headers: {
+      Authorization: authHeader,
+      "Content-Disposition": `attachment; filename="${safeName}"`
+    },
+    body: createReadStream(filepath),
+    duplex: "half"
+  });
+  return response.json().catch(() => ({}));
+}
+
+export async function splitTrack(id, stem) {
+  const params = JSON.stringify([{ id, stem }]);
+  const response = await fetch(`${LALAL_API_URL}/split/`, {
+    method: "POST",
+    headers: formHeaders,
+    body: new URLSearchParams({ params })
+  });
+  return response.json().catch(() => ({}));
+}
+
+export async function checkTasks(id) {
+  const response = await fetch(`${LALAL_API_URL}/check/`, {
+    method: "POST",
+    headers: formHeaders,
+    body: new URLSearchParams({ id })
+  });
+  return response.json().catch(() => ({}));
+}
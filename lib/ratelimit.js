@@ -0,0 +1,63 @@
+// lib/ratelimit.js
+export const DAILY_LIMIT = 3;
+const PROCESSING_TTL_MS = 10 * 60 * 1000; // longest plausible separation
+
+const dailyUploads = new Map();
+
+export function getClientIP(req) {
+  return (
+    req.headers["x-forwarded-for"]?.split(",")[0]?.trim() ||
+    req.headers["x-real-ip"] ||
+    req.socket?.remoteAddress ||
+    "127.0.0.1"
+  );
+}
+
+function cleanupOldEntries() {
+  const today = new Date().toDateString();
+  for (const [ip, data] of dailyUploads.entries()) {
+    if (data.date !== today) dailyUploads.delete(ip);
+  }
+}
+setInterval(cleanupOldEntries, 60 * 60 * 1000);
+
+export function checkRateLimit(ip) {
+  const today = new Date().toDateString();
+  const data = dailyUploads.get(ip);
+  if (!data || data.date !== today) {
+    dailyUploads.set(ip, { count: 0, date: today, processing: false });
+    return { allowed: true, remaining: DAILY_LIMIT };
+  }
+  // The flag can outlive its job (closed tab, polls routed elsewhere), so it
+  // expires on its own rather than blocking the IP until the date rolls over
+  if (data.processing && Date.now() - (data.processingSince || 0) > PROCESSING_TTL_MS) {
+    data.processing = false;
+  }
+  if (data.processing) return { allowed: false, error: "Already processing", remaining: DAILY_LIMIT - data.count };
+  return { allowed: data.count < DAILY_LIMIT, remaining: DAILY_LIMIT - data.count };
+}
+
+export function setProcessing(ip, val) {
+  const today = new Date().toDateString();
+  const data = dailyUploads.get(ip) || { count: 0, date: today };
+  data.processing = val;
+  data.processingSince = val ? Date.now() : 0;
+  dailyUploads.set(ip, data);
+}
+
+export function incrementRate(ip) {
+  const today = new Date().toDateString();
+  const data = dailyUploads.get(ip) || { count: 0, date: today, processing: false };
+  data.count += 1;
+  data.processing = false;
+  dailyUploads.set(ip, data);
+}
+
+export function decrementRate(ip) {
+  const data = dailyUploads.get(ip);
+  if (data) {
+    data.count = Math.max(0, data.count - 1);
+    data.processing = false;
+    dailyUploads.set(ip, data);
+  }
+}
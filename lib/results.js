@@ -0,0 +1,29 @@
+// lib/results.js
+const TTL_MS = 60 * 60 * 1000; // LALAL result URLs are not kept forever
+const MAX_ENTRIES = 100;
+
+const results = new Map();
+
+export function getResult(key) {
+  const entry = results.get(key);
+  if (!entry) return null;
+
+  if (Date.now() - entry.storedAt > TTL_MS) {
+    results.delete(key);
+    return null;
+  }
+
+  // Re-insert so Map iteration order doubles as LRU order
+  results.delete(key);
+  results.set(key, entry);
+  return entry.split;
+}
+
+export function setResult(key, split) {
+  results.delete(key);
+  results.set(key, { split, storedAt: Date.now() });
+
+  while (results.size > MAX_ENTRIES) {
+    results.delete(results.keys().next().value);
+  }
+}
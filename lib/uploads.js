@@ -1,3 +1,31 @@
 // lib/uploads.js
+import { createHash } from "crypto";
+import { createReadStream } from "fs";
+import { unlink } from "fs/promises";
+
+const TTL_MS = 60 * 60 * 1000;
+
 const uploads = new Map();
+
+function cleanupExpired() {
+  const cutoff = Date.now() - TTL_MS;
+  for (const [id, entry] of uploads.entries()) {
+    if (entry.storedAt < cutoff) {
+      uploads.delete(id);
+      if (entry.filepath) unlink(entry.filepath).catch(() => {});
+    }
+  }
+}
+setInterval(cleanupExpired, 60 * 60 * 1000);
+
+export function hashFile(filepath) {
+  return new Promise((resolve, reject) => {
+    const hash = createHash("sha256");
+    createReadStream(filepath)
+      .on("error", reject)
+      .on("data", (chunk) => hash.update(chunk))
+      .on("end", () => resolve(hash.digest("hex")));
+  });
+}
+
 export default uploads;